@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extractor import ProductPageParser
+from models import ProductDetails
+from shopify_scraper import product_from_parser
+
+# Compares CPU time and peak memory of the streaming extractor against the
+# original BeautifulSoup parser over a directory of saved product pages.
+#
+#   python benchmarks/bench_extract.py [--corpus DIR] [--repeat N]
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CHUNK_SIZE = 16384  # roughly what httpx hands back per aiter_text() chunk
+
+# Baseline: the original full-tree BeautifulSoup parser, kept here for comparison
+def parse_with_soup(html: str) -> ProductDetails:
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Extract title from og:title or fallback to <title>
+    title_tag = soup.find("meta", {"property": "og:title"})
+    title = title_tag["content"].strip() if title_tag and title_tag.get("content") else (soup.find("title").text.strip() if soup.find("title") else "N/A")
+
+    # Extract description from og:description
+    desc_tag = soup.find("meta", {"property": "og:description"})
+    description = desc_tag["content"].strip() if desc_tag and desc_tag.get("content") else "N/A"
+
+    # Extract image URL from og:image
+    image_tag = soup.find("meta", {"property": "og:image"})
+    image_url = image_tag["content"].strip() if image_tag and image_tag.get("content") else None
+
+    # Initialize price
+    price = None
+
+    # Try meta tag for price
+    meta_price = soup.find("meta", {"property": "product:price:amount"})
+    if meta_price and meta_price.get("content"):
+        price = meta_price["content"].strip()
+
+    # Fallback: Try JSON-LD script blocks
+    if not price:
+        ld_json_tags = soup.find_all("script", {"type": "application/ld+json"})
+        for tag in ld_json_tags:
+            if not tag.string:
+                continue
+            try:
+                data = json.loads(tag.string)
+                if isinstance(data, dict) and data.get("@type") == "Product":
+                    offers = data.get("offers")
+                    if offers and isinstance(offers, dict) and "price" in offers:
+                        price = offers["price"]
+                        break
+                elif isinstance(data, list):
+                    for item in data:
+                        if isinstance(item, dict) and item.get("@type") == "Product":
+                            offers = item.get("offers")
+                            if offers and isinstance(offers, dict) and "price" in offers:
+                                price = offers["price"]
+                                break
+                    if price:
+                        break
+            except (json.JSONDecodeError, TypeError):
+                pass
+
+    # Fallback: Check application/json script blocks for variants
+    if not price:
+        json_scripts = soup.find_all("script", {"type": "application/json"})
+        for script_tag in json_scripts:
+            if not script_tag.string:
+                continue
+            try:
+                data = json.loads(script_tag.string)
+                if isinstance(data, dict):
+                    variants = data.get("variants")
+                    if variants and isinstance(variants, list) and len(variants) > 0:
+                        possible_price = variants[0].get("price")
+                        if possible_price:
+                            price = possible_price.strip()
+                            break
+            except (json.JSONDecodeError, TypeError):
+                pass
+            if price:
+                break
+
+    # Final fallback if price is still not found
+    if not price:
+        price = None
+
+    return ProductDetails(
+        title=title,
+        description=description,
+        price=price,
+        image_url=image_url
+    )
+
+
+# Streaming extractor fed in network-sized chunks, stopping early like the scraper does
+def parse_streaming(html: str) -> ProductDetails:
+    parser = ProductPageParser()
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+        if parser.done:
+            break
+    else:
+        parser.close()
+    return product_from_parser(parser)
+
+# Return (mean CPU seconds, peak traced bytes, result) for one parser on one page
+def measure(parse, html: str, repeat: int):
+    start = time.process_time()
+    for _ in range(repeat):
+        parse(html)
+    cpu = (time.process_time() - start) / repeat
+
+    tracemalloc.start()
+    result = parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak, result
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark product page extraction")
+    arg_parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="directory of saved .html product pages")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="parses per page per parser")
+    args = arg_parser.parse_args()
+
+    pages = sorted(f for f in os.listdir(args.corpus) if f.endswith(".html"))
+    if not pages:
+        sys.exit(f"No .html files found in {args.corpus}")
+
+    print(f"{'page':<32}{'size KB':>9}{'soup ms':>10}{'stream ms':>11}{'soup MB':>9}{'stream MB':>11}  match")
+    totals = [0.0, 0.0]
+    for name in pages:
+        with open(os.path.join(args.corpus, name), encoding="utf-8") as f:
+            html = f.read()
+        soup_cpu, soup_peak, soup_result = measure(parse_with_soup, html, args.repeat)
+        stream_cpu, stream_peak, stream_result = measure(parse_streaming, html, args.repeat)
+        totals[0] += soup_cpu
+        totals[1] += stream_cpu
+        match = "yes" if soup_result == stream_result else "NO"
+        print(
+            f"{name[:31]:<32}{len(html) / 1024:>9.0f}{soup_cpu * 1000:>10.2f}{stream_cpu * 1000:>11.2f}"
+            f"{soup_peak / 2**20:>9.2f}{stream_peak / 2**20:>11.2f}  {match}"
+        )
+    print(f"\nTotal CPU per pass: soup {totals[0] * 1000:.2f} ms, streaming {totals[1] * 1000:.2f} ms "
+          f"({totals[0] / totals[1]:.1f}x)")
+
+if __name__ == "__main__":
+    main()
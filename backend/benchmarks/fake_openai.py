@@ -0,0 +1,134 @@
+import argparse
+import base64
+import json
+import os
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from faults import add_fault_arguments, injector_from_args, install_faults
+
+# Local stand-in for the OpenAI API: chat completions (plain and streamed)
+# and image generations, with injectable latency, 500s and 429s.
+#
+#   python benchmarks/fake_openai.py --port 9100 --latency 0.8 --rate-limit-rate 0.05
+#
+# Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+
+# 1x1 transparent PNG; random trailing bytes make every image unique
+PNG_PIXEL = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+AD_TEXT = (
+    "Meet your new everyday favourite. Built to last and priced to move, it's the upgrade "
+    "you'll wonder how you lived without. Order today and see the difference for yourself!"
+)
+IMAGE_PROMPT = "Pixel art of the product on a sunny cartoon beach, bright bold shapes, no text."
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def completion_text(messages: list) -> str:
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    return IMAGE_PROMPT if "DALL" in system else AD_TEXT
+
+
+def create_app(injector) -> FastAPI:
+    app = FastAPI()
+    install_faults(app, injector)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        text = completion_text(messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "gpt-3.5-turbo")
+        prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": count_tokens(text),
+            "total_tokens": prompt_tokens + count_tokens(text)
+        }
+
+        if body.get("stream"):
+            async def generate():
+                words = text.split(" ")
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": word if i == 0 else f" {word}"},
+                            "finish_reason": None
+                        }]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    usage_chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [],
+                        "usage": usage
+                    }
+                    yield f"data: {json.dumps(usage_chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(generate(), media_type="text/event-stream")
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        }
+
+    @app.post("/v1/images/generations")
+    async def image_generations(request: Request):
+        body = await request.json()
+        n = int(body.get("n", 1))
+        data = []
+        for _ in range(n):
+            image = PNG_PIXEL + os.urandom(16)
+            if body.get("response_format") == "b64_json":
+                data.append({"b64_json": base64.b64encode(image).decode()})
+            else:
+                data.append({"url": f"{request.base_url}fake-images/{uuid.uuid4().hex}.png"})
+        return {"created": int(time.time()), "data": data}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI API for benchmarks")
+    parser.add_argument("--port", type=int, default=9100)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(injector_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import os
+import uvicorn
+from email.utils import formatdate
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import HTMLResponse
+from faults import add_fault_arguments, injector_from_args, install_faults
+
+# Local stand-in for a Shopify storefront. Product pages are served from the
+# fixture pages in benchmarks/corpus (any handle works; handles are spread
+# over the fixtures), plus /products.json and /products/<handle>.js feeds.
+# Pages carry an ETag and Last-Modified and answer conditional GETs with 304.
+#
+#   python benchmarks/fake_shopify.py --port 9200 --latency 0.2 --catalog-size 2000
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+PAGE_LIMIT_MAX = 250
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+def load_fixtures(corpus_dir: str) -> list:
+    fixtures = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith(".html"):
+            with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+                fixtures.append(f.read())
+    if not fixtures:
+        raise SystemExit(f"No .html fixtures found in {corpus_dir}")
+    return fixtures
+
+
+def fixture_index(handle: str, count: int) -> int:
+    return int(hashlib.sha256(handle.encode("utf-8")).hexdigest(), 16) % count
+
+
+def product_json(index: int, cents: bool = False) -> dict:
+    price = 1000 + index
+    return {
+        "id": index + 1,
+        "title": f"Fixture Product {index}",
+        "handle": f"fixture-{index}",
+        "body_html": f"<p>Fixture product number {index}, made for load testing.</p>",
+        "variants": [{"id": 10000 + index, "price": price if cents else f"{price / 100:.2f}"}],
+        "images": [{"src": f"//fixture-store.myshopify.com/cdn/shop/files/fixture-{index}.jpg"}]
+    }
+
+
+def create_app(injector, fixtures: list, catalog_size: int) -> FastAPI:
+    app = FastAPI()
+    install_faults(app, injector)
+    etags = [f'"{hashlib.sha256(page.encode("utf-8")).hexdigest()[:32]}"' for page in fixtures]
+
+    @app.get("/products.json")
+    def products_feed(limit: int = 30, page: int = 1):
+        limit = min(max(limit, 1), PAGE_LIMIT_MAX)
+        start = (page - 1) * limit
+        stop = min(start + limit, catalog_size)
+        return {"products": [product_json(i) for i in range(start, stop)]}
+
+    @app.get("/products/{handle}")
+    def product_page(handle: str, request: Request):
+        if handle.endswith(".js"):
+            base = handle[:-3]
+            index = int(base.rsplit("-", 1)[-1]) if base.rsplit("-", 1)[-1].isdigit() else 0
+            return product_json(index, cents=True)
+
+        index = fixture_index(handle, len(fixtures))
+        headers = {"ETag": etags[index], "Last-Modified": LAST_MODIFIED}
+        if request.headers.get("if-none-match") == etags[index]:
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(fixtures[index], headers=headers)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Shopify storefront for benchmarks")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="directory of fixture product pages")
+    parser.add_argument("--catalog-size", type=int, default=1000, help="products listed in /products.json")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    app = create_app(injector_from_args(args), load_fixtures(args.corpus), args.catalog_size)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
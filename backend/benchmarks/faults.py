@@ -0,0 +1,75 @@
+import asyncio
+import random
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+# Shared latency / failure injection for the fake OpenAI and Shopify servers
+
+
+# Parses --latency/--jitter/--error-rate/--rate-limit-rate style settings
+# and decides, per request, how long to stall and whether to fail
+class FaultInjector:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    async def delay(self):
+        seconds = self.latency + random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    # Return an error response to send instead of the real one, or None
+    def failure(self):
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self.counts["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"Retry-After": f"{self.retry_after:g}"}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.counts["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Internal server error (injected)", "type": "server_error"}},
+                status_code=500
+            )
+        return None
+
+    # Middleware: stall, then maybe fail, before the real handler runs
+    async def middleware(self, request: Request, call_next):
+        if request.url.path == "/_faults":
+            return await call_next(request)
+        self.counts["requests"] += 1
+        await self.delay()
+        failure = self.failure()
+        if failure is not None:
+            return failure
+        return await call_next(request)
+
+
+def add_fault_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean added latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- uniform jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with injected 429s")
+
+
+def injector_from_args(args) -> FaultInjector:
+    return FaultInjector(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.retry_after)
+
+
+# Install the injector on an app and expose its counters at /_faults
+def install_faults(app, injector: FaultInjector):
+    app.middleware("http")(injector.middleware)
+
+    @app.get("/_faults")
+    def fault_counts():
+        return injector.counts
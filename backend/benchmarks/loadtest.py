@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import httpx
+
+# Load driver for the backend API. For each endpoint and concurrency level it
+# fires a fixed number of requests and reports p50/p95/p99 latency, throughput
+# and error rate, then writes everything to a JSON file for comparing versions.
+#
+# Self-contained run against local fakes (no network, no OpenAI spend):
+#   python benchmarks/loadtest.py --start-servers --concurrency 1,10,50 --output results.json
+#
+# Compare with a previous run:
+#   python benchmarks/loadtest.py --start-servers --baseline results-main.json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+ENDPOINTS = ["scrape", "generate_ad", "generate_image", "publish_ad"]
+
+# Backend limiter settings recorded in the report, so runs are comparable
+LIMITER_SETTINGS = [
+    "OPENAI_RPM", "OPENAI_TPM", "OPENAI_IMAGES_PER_MINUTE", "OPENAI_MAX_IN_FLIGHT",
+    "SCRAPE_PER_HOST_CONCURRENCY", "SCRAPE_PER_HOST_DELAY"
+]
+
+
+# Build the HTTP request for the i-th call to an endpoint. Inputs are unique
+# per request (unless --distinct caps them) so caches don't hide the real cost.
+def build_request(endpoint: str, i: int, args, run_id: str):
+    item = i % args.distinct if args.distinct else i
+    if endpoint == "scrape":
+        product_url = f"{args.shop_url}/products/bench-{run_id}-{item}?utm_source=loadtest"
+        return "GET", "/scrape/", {"params": {"url": product_url}}
+    if endpoint == "generate_ad":
+        return "POST", "/generate_ad/", {"json": {
+            "title": f"Bench Product {run_id}-{item}",
+            "description": "A heavyweight cotton canvas tote with reinforced handles.",
+            "price": "29.00"
+        }}
+    if endpoint == "generate_image":
+        return "POST", "/generate_image/", {"json": {
+            "prompt": f"Bench product {run_id}-{item}: a heavyweight cotton canvas tote."
+        }}
+    if endpoint == "publish_ad":
+        return "POST", "/publish_ad/", {"json": {
+            "platform": "facebook",
+            "accountId": "bench",
+            "shareText": True,
+            "shareImage": True,
+            "productLink": f"{args.shop_url}/products/bench-{item}",
+            "adText": "Bench ad text",
+            "adImage": None
+        }}
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct * len(sorted_values) / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+# Some endpoints report failures in a 200 body: {"error": ...} for the
+# generators, and a title of "N/A" for /scrape/ when the page fetch failed
+def is_success(endpoint: str, response: httpx.Response) -> bool:
+    if not response.is_success:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    if not isinstance(body, dict):
+        return True
+    if endpoint == "scrape" and body.get("title") == "N/A":
+        return False
+    return "error" not in body
+
+
+# Run `total` requests against one endpoint with `concurrency` workers in flight
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int, args) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    latencies = []
+    errors = {}
+    next_index = iter(range(total))
+
+    async def worker():
+        for i in next_index:
+            method, path, kwargs = build_request(endpoint, i, args, run_id)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = is_success(endpoint, response)
+                reason = "ok" if ok else f"status {response.status_code}" if not response.is_success else "error body"
+            except httpx.HTTPError as e:
+                ok, reason = False, type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors[reason] = errors.get(reason, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    error_count = sum(errors.values())
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": error_count,
+        "error_rate": round(error_count / total, 4) if total else 0.0,
+        "error_breakdown": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+        }
+    }
+
+
+def wait_for(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+def fault_args(latency: float, args) -> list:
+    return [
+        "--latency", str(latency),
+        "--jitter", str(latency / 4),
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate)
+    ]
+
+
+# Environment for the spawned backend. It gets generous OpenAI quotas and no
+# per-host scrape throttling (every fake product is on one host), so the run
+# measures the service, not the production limiters (override with --app-env).
+def backend_env(args, workdir: str) -> dict:
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "OPENAI_API_KEY": "sk-loadtest",
+        "OPENAI_RPM": "1000000",
+        "OPENAI_TPM": "1000000000",
+        "OPENAI_IMAGES_PER_MINUTE": "1000000",
+        "SCRAPE_PER_HOST_CONCURRENCY": "10000",
+        "SCRAPE_PER_HOST_DELAY": "0",
+        "JOBS_DB": os.path.join(workdir, "jobs.db"),
+        "IMAGE_STORE_DIR": os.path.join(workdir, "images")
+    }
+    for setting in args.app_env:
+        key, _, value = setting.partition("=")
+        env[key] = value
+    return env
+
+
+# Start the fake OpenAI server, fake storefront and the backend itself
+def start_servers(args, env: dict) -> list:
+    openai_url = f"http://127.0.0.1:{args.openai_port}"
+    processes = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "fake_openai.py"), "--port", str(args.openai_port)]
+            + fault_args(args.openai_latency, args),
+            cwd=BENCH_DIR
+        ),
+        subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "fake_shopify.py"), "--port", str(args.shop_port)]
+            + fault_args(args.shop_latency, args),
+            cwd=BENCH_DIR
+        )
+    ]
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    ))
+    wait_for(f"{openai_url}/_faults")
+    wait_for(f"{args.shop_url}/_faults")
+    wait_for(f"{args.base_url}/")
+    return processes
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(results: list, baseline: dict):
+    print(f"{'endpoint':<16}{'conc':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err %':>8}  vs baseline p95")
+    for result in results:
+        latency = result["latency_ms"]
+        delta = ""
+        previous = baseline.get((result["endpoint"], result["concurrency"]))
+        if previous and previous["latency_ms"]["p95"]:
+            change = (latency["p95"] - previous["latency_ms"]["p95"]) / previous["latency_ms"]["p95"] * 100
+            delta = f"{change:+.1f}%"
+        print(
+            f"{result['endpoint']:<16}{result['concurrency']:>6}{result['throughput_rps']:>10.1f}"
+            f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}"
+            f"{result['error_rate'] * 100:>8.1f}  {delta}"
+        )
+
+
+def load_baseline(path: str) -> dict:
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {(r["endpoint"], r["concurrency"]): r for r in data["results"]}
+
+
+async def run(args) -> list:
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2, max_keepalive_connections=max(args.concurrency))
+    results = []
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                result = await run_level(client, endpoint, concurrency, args.requests, args)
+                print(f"  {endpoint} @ {concurrency}: {result['throughput_rps']} rps, "
+                      f"p95 {result['latency_ms']['p95']} ms, errors {result['errors']}")
+                results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput benchmark for the backend API")
+    parser.add_argument("--base-url", default=None, help="backend URL (default http://127.0.0.1:<app-port>)")
+    parser.add_argument("--shop-url", default=None, help="storefront URL to scrape (default the fake storefront)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,10,50", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint per concurrency level")
+    parser.add_argument("--distinct", type=int, default=0, help="cycle through this many distinct inputs (0 = all unique)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare p95 against")
+    parser.add_argument("--start-servers", action="store_true", help="spawn the fakes and the backend locally")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--openai-port", type=int, default=9100)
+    parser.add_argument("--shop-port", type=int, default=9200)
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="fake OpenAI latency in seconds")
+    parser.add_argument("--shop-latency", type=float, default=0.1, help="fake storefront latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake upstream 500s")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of fake upstream 429s")
+    parser.add_argument("--app-env", action="append", default=[], help="KEY=VALUE env for the spawned backend")
+    args = parser.parse_args()
+
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.base_url = (args.base_url or f"http://127.0.0.1:{args.app_port}").rstrip("/")
+    args.shop_url = (args.shop_url or f"http://127.0.0.1:{args.shop_port}").rstrip("/")
+
+    processes = []
+    limiter_settings = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if args.start_servers:
+                env = backend_env(args, workdir)
+                # Unset values fall back to the backend's own defaults
+                limiter_settings = {name: env.get(name) for name in LIMITER_SETTINGS}
+                processes = start_servers(args, env)
+            results = asyncio.run(run(args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "base_url": args.base_url,
+            "requests_per_level": args.requests,
+            "started_servers": args.start_servers,
+            "fake_openai_latency_s": args.openai_latency if args.start_servers else None,
+            "fake_shop_latency_s": args.shop_latency if args.start_servers else None,
+            "injected_error_rate": args.error_rate if args.start_servers else None,
+            "injected_rate_limit_rate": args.rate_limit_rate if args.start_servers else None,
+            "backend_limits": limiter_settings
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    print_table(results, load_baseline(args.baseline))
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+# Content-addressed key for a generation: identical model + prompts share a key
+def cache_key(model: str, system_prompt: str, prompt: str) -> str:
+    payload = json.dumps([model, system_prompt, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Two-tier cache for LLM generations: an in-process LRU in front of an
+# optional SQLite file. Both tiers expire entries after `ttl` seconds and
+# evict least-recently-used entries once they hold more than their max count.
+# SQLite work runs in a worker thread so it never blocks the event loop; disk
+# reads don't write, their access times are batched into the periodic
+# eviction pass that runs at most every `evict_interval` seconds.
+class GenerationCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600,
+                 db_path: Optional[str] = None, max_disk_entries: int = 50000,
+                 evict_interval: float = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.evict_interval = evict_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._touched = {}
+        self._last_eviction = 0.0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypasses": 0, "evictions": 0}
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS generations_accessed ON generations (accessed_at)")
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._disk_get, key)
+            # Expired rows are left for the eviction pass to delete
+            if row is not None and now - row[1] < self.ttl:
+                value, created_at = row
+                with self._lock:
+                    self._remember(key, value, created_at)
+                    self._touched[key] = now
+                    self.stats["disk_hits"] += 1
+                return value
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._touched.pop(key, None)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, now)
+
+    def _disk_get(self, key: str):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT value, created_at FROM generations WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _disk_set(self, key: str, value: str, now: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO generations (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if now - self._last_eviction >= self.evict_interval:
+                self._last_eviction = now
+                with self._lock:
+                    touched, self._touched = self._touched, {}
+                self._db.executemany(
+                    "UPDATE generations SET accessed_at = ? WHERE key = ?",
+                    [(accessed_at, touched_key) for touched_key, accessed_at in touched.items()]
+                )
+                self._db.execute(
+                    "DELETE FROM generations WHERE created_at <= ? OR key IN ("
+                    "SELECT key FROM generations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (now - self.ttl, self.max_disk_entries)
+                )
+            self._db.commit()
+
+    # Record that a caller deliberately skipped the cache (e.g. a refine request)
+    def bypass(self):
+        with self._lock:
+            self.stats["bypasses"] += 1
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._db is not None
+            }
@@ -0,0 +1,126 @@
+import json
+from html.parser import HTMLParser
+
+# og:/product: meta properties we read from the page head
+META_PROPERTIES = {"og:title", "og:description", "og:image", "product:price:amount"}
+
+# Script types that can carry product price data
+JSON_SCRIPT_TYPES = {"application/ld+json", "application/json"}
+
+
+# Return the first Product offer price from a JSON-LD payload, if any
+def ld_json_price(data):
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if isinstance(item, dict) and item.get("@type") == "Product":
+            offers = item.get("offers")
+            if offers and isinstance(offers, dict) and "price" in offers:
+                return offers["price"]
+    return None
+
+
+# Return the first variant price from an application/json product blob, if any
+def variant_price(data):
+    if isinstance(data, dict):
+        variants = data.get("variants")
+        if variants and isinstance(variants, list) and isinstance(variants[0], dict):
+            possible_price = variants[0].get("price")
+            if possible_price:
+                return str(possible_price).strip()
+    return None
+
+
+# Single-pass product extractor for Shopify pages.
+# Feed it chunks of HTML; `done` flips once everything the scraper
+# needs has been seen, so the caller can stop downloading the body.
+class ProductPageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.title_text = None
+        self.ld_price = None
+        self.json_price = None
+        self.head_closed = False
+        self.done = False
+        self._in_title = False
+        self._title_parts = []
+        self._script_type = None
+        self._script_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            attributes = dict(attrs)
+            prop = attributes.get("property")
+            content = attributes.get("content")
+            if prop in META_PROPERTIES and prop not in self.meta and content and content.strip():
+                self.meta[prop] = content.strip()
+        elif tag == "title" and self.title_text is None and not self.head_closed:
+            self._in_title = True
+        elif tag == "script":
+            script_type = (dict(attrs).get("type") or "").strip().lower()
+            if script_type in JSON_SCRIPT_TYPES:
+                self._script_type = script_type
+                self._script_parts = []
+        elif tag == "body":
+            self._close_head()
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title_text = "".join(self._title_parts).strip()
+        elif tag == "script" and self._script_type:
+            self._finish_script()
+        elif tag == "head":
+            self._close_head()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+        elif self._script_type:
+            self._script_parts.append(data)
+
+    def _close_head(self):
+        self.head_closed = True
+        self._update_done()
+
+    def _finish_script(self):
+        script_type, body = self._script_type, "".join(self._script_parts)
+        self._script_type = None
+        self._script_parts = []
+        # Skip parsing once a higher-priority price source is already known
+        if not body.strip() or "product:price:amount" in self.meta or self.ld_price is not None:
+            return
+        if script_type == "application/json" and self.json_price is not None:
+            return
+        try:
+            data = json.loads(body)
+        except (json.JSONDecodeError, TypeError):
+            return
+        if script_type == "application/ld+json":
+            self.ld_price = ld_json_price(data)
+        else:
+            self.json_price = variant_price(data)
+        self._update_done()
+
+    # Price priority is meta tag > JSON-LD > variants JSON, so we can only
+    # stop early once the head is parsed and one of the first two is known
+    def _update_done(self):
+        if self.head_closed and ("product:price:amount" in self.meta or self.ld_price is not None):
+            self.done = True
+
+    @property
+    def title(self):
+        return self.meta.get("og:title") or self.title_text or "N/A"
+
+    @property
+    def description(self):
+        return self.meta.get("og:description") or "N/A"
+
+    @property
+    def image_url(self):
+        return self.meta.get("og:image")
+
+    @property
+    def price(self):
+        price = self.meta.get("product:price:amount") or self.ld_price or self.json_price
+        return str(price).strip() if price not in (None, "") else None
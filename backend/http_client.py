@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import httpx
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Pool sizing for the shared client
+MAX_CONNECTIONS = 200
+MAX_KEEPALIVE_CONNECTIONS = 100
+KEEPALIVE_EXPIRY = 30
+
+# Politeness settings applied per storefront host
+PER_HOST_CONCURRENCY = int(os.environ.get("SCRAPE_PER_HOST_CONCURRENCY", "8"))
+PER_HOST_DELAY = float(os.environ.get("SCRAPE_PER_HOST_DELAY", "0.05"))  # minimum seconds between request starts to one host
+MAX_RATE_LIMIT_RETRIES = 2
+MAX_RETRY_AFTER = 10  # never park a request longer than this on a 429
+# Scrape URLs come from clients, so only this many host throttles are kept;
+# the least recently used idle ones are dropped beyond that
+MAX_TRACKED_HOSTS = 1024
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+_client = None
+_hosts = OrderedDict()
+
+
+# Concurrency cap and request spacing for a single host
+class HostThrottle:
+    def __init__(self, concurrency: int, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+        self.active = 0
+
+    # Safe to forget: no request holds or waits for a slot, and no back-off is pending
+    def idle(self) -> bool:
+        return self.active == 0 and self.next_start <= time.monotonic()
+
+    async def wait_turn(self):
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_start > now:
+                await asyncio.sleep(self.next_start - now)
+                now = self.next_start
+            self.next_start = now + self.delay
+
+    # Push the next start back when the host tells us to slow down
+    def back_off(self, seconds: float):
+        self.next_start = max(self.next_start, time.monotonic() + seconds)
+
+
+# Return the process-wide AsyncClient, creating it on first use
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=DEFAULT_TIMEOUT,
+            follow_redirects=True,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+
+# Close the shared client (called on application shutdown)
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _hosts.clear()
+
+
+def get_throttle(url: str) -> HostThrottle:
+    host = urlparse(url).netloc.lower()
+    throttle = _hosts.get(host)
+    if throttle is None:
+        throttle = _hosts[host] = HostThrottle(PER_HOST_CONCURRENCY, PER_HOST_DELAY)
+        evict_idle_throttles()
+    _hosts.move_to_end(host)
+    return throttle
+
+
+# Drop least recently used idle throttles while over MAX_TRACKED_HOSTS.
+# Busy ones are kept, so a host never ends up with two throttles at once.
+def evict_idle_throttles():
+    excess = len(_hosts) - MAX_TRACKED_HOSTS
+    if excess <= 0:
+        return
+    for host in [host for host, throttle in _hosts.items() if throttle.idle()][:excess]:
+        del _hosts[host]
+
+
+# Parse a Retry-After header (seconds or HTTP date) into a capped delay
+def retry_after_seconds(response: httpx.Response, default: float = 1.0) -> float:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            seconds = default
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+# Hold one of the host's concurrency slots for the duration of a request
+@asynccontextmanager
+async def host_slot(url: str):
+    throttle = get_throttle(url)
+    throttle.active += 1
+    try:
+        async with throttle.semaphore:
+            await throttle.wait_turn()
+            yield throttle
+    finally:
+        throttle.active -= 1
+
+
+# GET a URL through the shared pool, honouring per-host limits and 429 Retry-After
+async def fetch(url: str, **kwargs) -> httpx.Response:
+    client = get_client()
+    attempt = 0
+    while True:
+        async with host_slot(url) as throttle:
+            response = await client.get(url, **kwargs)
+            if response.status_code != 429 or attempt >= MAX_RATE_LIMIT_RETRIES:
+                return response
+            delay = retry_after_seconds(response)
+            throttle.back_off(delay)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+# Stream a GET response through the shared pool so callers can stop reading
+# the body early; same per-host limits and 429 handling as fetch()
+@asynccontextmanager
+async def fetch_stream(url: str, **kwargs):
+    client = get_client()
+    attempt = 0
+    while True:
+        async with host_slot(url) as throttle:
+            async with client.stream("GET", url, **kwargs) as response:
+                if response.status_code != 429 or attempt >= MAX_RATE_LIMIT_RETRIES:
+                    yield response
+                    return
+                delay = retry_after_seconds(response)
+                throttle.back_off(delay)
+        attempt += 1
+        await asyncio.sleep(delay)
@@ -0,0 +1,142 @@
+import asyncio
+import base64
+import hashlib
+import os
+import re
+from generation_cache import GenerationCache, cache_key
+from http_client import fetch
+from metrics import log_event, stage_timer
+from openai_client import chat_completion, generate_images
+
+IMAGE_PROMPT_MODEL = "gpt-3.5-turbo"
+IMAGE_PROMPT_SYSTEM_PROMPT = "You are a creative AI prompt writer for DALL·E."
+IMAGE_SIZE = "1024x1024"
+MAX_VARIATIONS = 10
+
+# Each stage has its own concurrency cap, so a slow DALL·E call only holds an
+# image slot while other requests keep moving through prompt writing
+PROMPT_STAGE_CONCURRENCY = int(os.environ.get("IMAGE_PROMPT_CONCURRENCY", "32"))
+IMAGE_STAGE_CONCURRENCY = int(os.environ.get("IMAGE_RENDER_CONCURRENCY", "16"))
+
+IMAGE_STORE_DIR = os.environ.get(
+    "IMAGE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_store")
+)
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+_stage_limits = {}
+
+
+def stage_limit(stage: str, concurrency: int) -> asyncio.Semaphore:
+    if stage not in _stage_limits:
+        _stage_limits[stage] = asyncio.Semaphore(concurrency)
+    return _stage_limits[stage]
+
+
+# Content-addressed image files: <root>/<first two hex chars>/<sha256>.png
+class ImageStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"Invalid image digest: {digest}")
+        return os.path.join(self.root, digest[:2], f"{digest}.png")
+
+    def exists(self, digest: str) -> bool:
+        try:
+            return os.path.isfile(self.path(digest))
+        except ValueError:
+            return False
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial image
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+
+image_store = ImageStore(IMAGE_STORE_DIR)
+
+
+# Render the GPT instruction that produces a DALL·E prompt for a product
+def build_image_gpt_prompt(product_prompt: str, refine: bool) -> str:
+    if refine:
+        gpt_prompt = f"""
+            Previously, you created a DALL·E prompt for this product.
+            Now produce a second variation in a simple, minimal pixel art style
+            with bright, bold shapes. Keep the entire prompt under 500 characters.
+
+            Product details: {product_prompt}
+            """
+    else:
+        gpt_prompt = f"""
+            You are an AI prompt writer for DALL·E.
+            Please create a short (under 500 characters) pixel art style prompt
+            that highlights the following product in a fun, cartoony environment.
+            Avoid large textual overlays in the image.
+
+            Product details: {product_prompt}
+            """
+    return gpt_prompt
+
+
+# Stage 1: have GPT write the DALL·E prompt (cached unless refining)
+async def write_image_prompt(product_prompt: str, refine: bool, cache: GenerationCache) -> str:
+    gpt_prompt = build_image_gpt_prompt(product_prompt, refine)
+    key = cache_key(IMAGE_PROMPT_MODEL, IMAGE_PROMPT_SYSTEM_PROMPT, gpt_prompt)
+    if refine:
+        cache.bypass()
+    else:
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
+
+    async with stage_limit("prompt", PROMPT_STAGE_CONCURRENCY):
+        gpt_response = await chat_completion(
+            IMAGE_PROMPT_MODEL,
+            [
+                {"role": "system", "content": IMAGE_PROMPT_SYSTEM_PROMPT},
+                {"role": "user", "content": gpt_prompt}
+            ],
+            operation="gpt_image_prompt",
+            timeout=60
+        )
+    dall_e_prompt = gpt_response.choices[0].message.content.strip()
+    log_event("image_prompt_written", prompt_chars=len(dall_e_prompt), refine=refine)
+    if not refine:
+        await cache.set(key, dall_e_prompt)
+    return dall_e_prompt
+
+
+# Pull the bytes for one generated image, downloading only if the API sent a URL
+async def image_bytes(image) -> bytes:
+    if image.b64_json:
+        return base64.b64decode(image.b64_json)
+    response = await fetch(image.url, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+
+# Stage 2: generate `n` variations in one DALL·E call and persist them locally.
+# Returns the content digests of the stored images, in API order.
+async def render_images(dall_e_prompt: str, n: int = 1) -> list:
+    async with stage_limit("image", IMAGE_STAGE_CONCURRENCY):
+        image_response = await generate_images(
+            dall_e_prompt,
+            n=n,
+            size=IMAGE_SIZE,
+            response_format="b64_json",
+            timeout=120
+        )
+    payloads = await asyncio.gather(*(image_bytes(image) for image in image_response.data or []))
+    with stage_timer("image_store"):
+        return [await asyncio.to_thread(image_store.put, data) for data in payloads]
+
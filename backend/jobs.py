@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+from metrics import log_event
+
+# Job lifecycle: queued -> scraping -> generating -> completed | failed
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+# SQLite-backed job records, so queued and in-progress jobs survive a restart.
+# Methods block on SQLite; JobQueue calls them through asyncio.to_thread.
+class JobStore:
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, url TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.commit()
+
+    # Insert one queued job per URL in a single transaction
+    def create_many(self, urls: list) -> list:
+        now = time.time()
+        jobs = [
+            {"id": uuid.uuid4().hex, "url": url, "status": "queued", "result": None,
+             "error": None, "created_at": now, "updated_at": now}
+            for url in urls
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO jobs (id, url, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                [(job["id"], job["url"], now, now) for job in jobs]
+            )
+            self._db.commit()
+        return jobs
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def update(self, job_id: str, status: str, result: dict = None, error: str = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = COALESCE(?, result), error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    # Put every job that never reached a terminal state back to queued and
+    # return their ids, oldest first
+    def requeue_unfinished(self) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status NOT IN ('completed', 'failed') ORDER BY created_at"
+            ).fetchall()
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status NOT IN ('completed', 'failed')",
+                (time.time(),)
+            )
+            self._db.commit()
+        return [row["id"] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Bounded worker pool that runs `handler(job_id, url, report)` for each job.
+# `await report(status, result=None)` records progress; the handler's return
+# value becomes the completed result and an exception marks the job failed.
+class JobQueue:
+    def __init__(self, store: JobStore, handler, workers: int = 8):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+        self._subscribers = {}
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        # Anything interrupted by a restart starts over from the beginning
+        for job_id in await asyncio.to_thread(self.store.requeue_unfinished):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit_many(self, urls: list) -> list:
+        jobs = await asyncio.to_thread(self.store.create_many, urls)
+        for job in jobs:
+            self._queue.put_nowait(job["id"])
+        return jobs
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    # Yield the job's current state, then every update until it finishes
+    async def subscribe(self, job_id: str):
+        updates = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(updates)
+        try:
+            job = await self.get(job_id)
+            while job is not None:
+                yield job
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                job = await updates.get()
+        finally:
+            self._subscribers[job_id].remove(updates)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    async def _publish(self, job_id: str, status: str, result: dict = None, error: str = None):
+        await asyncio.to_thread(self.store.update, job_id, status, result, error)
+        if job_id in self._subscribers:
+            job = await self.get(job_id)
+            # Subscribers may have left while the row was being read
+            for updates in self._subscribers.get(job_id, []):
+                updates.put_nowait(job)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await self.get(job_id)
+
+                async def report(status, result=None):
+                    await self._publish(job_id, status, result)
+                result = await self.handler(job_id, job["url"], report)
+                await self._publish(job_id, "completed", result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_event("job_failed", level=logging.WARNING, job_id=job_id, error=str(e))
+                await self._publish(job_id, "failed", error=str(e))
+            finally:
+                self._queue.task_done()
@@ -1,13 +1,40 @@
-from fastapi import FastAPI
-from shopify_scraper import scrape_shopify_product
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from shopify_scraper import scrape_product_with_status, scrape_shopify_product, scrape_shopify_products, scrape_shopify_store
+from product_cache import normalize_product_url, product_cache
+from http_client import close_client
+from openai_client import chat_completion, stream_chat_completion, backoff_delay
+from jobs import JobQueue, JobStore
+from metrics import current_store, log_event, metrics_middleware, observe_stage, record_usage, registry, store_label
+from image_pipeline import MAX_VARIATIONS, image_store, render_images, write_image_prompt
+import openai_client
+from generation_cache import GenerationCache, cache_key
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import openai
-import requests
-import time
-from typing import Optional
+import os
+from typing import List, Optional
+from urllib.parse import urlparse
+
+# Cap on URLs accepted by a single /scrape_batch/ call
+MAX_BATCH_URLS = 500
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume jobs left unfinished by the last run and start the workers
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    # Release pooled scraper and OpenAI connections on shutdown
+    await close_client()
+    await openai_client.close_client()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -18,18 +45,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency/status metrics and sampled request logs. Clients can send
+# X-Shop-Domain so OpenAI token usage is attributed to the right store.
+app.middleware("http")(metrics_middleware)
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition of all counters and histograms
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 def home():
     return {"message": "Shopify Product Scraper API is running"}
 
 @app.get("/scrape/")
-def scrape_product(url: str):
-    # Fetch product details from a Shopify URL
-    return scrape_shopify_product(url)
+async def scrape_product(url: str, response: Response):
+    # Fetch product details from a Shopify URL; X-Cache reports HIT, REVALIDATED or MISS
+    product, cache_status = await scrape_product_with_status(url)
+    response.headers["X-Cache"] = cache_status
+    try:
+        response.headers["X-Cache-Key"] = normalize_product_url(url)
+    except ValueError:
+        pass
+    return product
+
+@app.get("/product_cache_stats/")
+def product_cache_stats():
+    # Hit/revalidation/miss counters for the scraped-product cache
+    return product_cache.snapshot()
+
+# Batch scrape request: a list of Shopify product URLs
+class ScrapeBatchRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_URLS)
+
+@app.post("/scrape_batch/")
+async def scrape_batch(request: ScrapeBatchRequest):
+    # Scrape all URLs concurrently; results come back in request order
+    return await scrape_shopify_products(request.urls)
+
+@app.get("/scrape_store/")
+async def scrape_store(url: str):
+    # Stream every product in a Shopify store as newline-delimited JSON
+    async def generate():
+        async for product in scrape_shopify_store(url):
+            yield product.model_dump_json() + "\n"
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 # Set your OpenAI API key here
 openai.api_key = ""
 
+# Cache for GPT generations. Set GENERATION_CACHE_DB to a file path to
+# add a persistent SQLite tier behind the in-process LRU.
+generation_cache = GenerationCache(
+    max_entries=int(os.environ.get("GENERATION_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("GENERATION_CACHE_TTL", "86400")),
+    db_path=os.environ.get("GENERATION_CACHE_DB")
+)
+
+AD_COPY_MODEL = "gpt-3.5-turbo"
+AD_COPY_SYSTEM_PROMPT = "You are a professional marketing copywriter."
+
+@app.get("/cache_stats/")
+def cache_stats():
+    # Hit/miss counters for the generation cache
+    return generation_cache.snapshot()
+
+@app.get("/openai_status/")
+def openai_status():
+    # Circuit breaker state and remaining rate-limit budget for OpenAI calls
+    return openai_client.snapshot()
+
 # Ad Copy (Ad Text) Generation Endpoint
 class AdCopyRequest(BaseModel):
     title: str
@@ -37,9 +122,8 @@ class AdCopyRequest(BaseModel):
     price: str
     refine: bool = False  # Optional parameter to refine text
 
-@app.post("/generate_ad/")
-def generate_ad(request: AdCopyRequest):
-    print(f"Received ad copy request: {request}")
+# Render the ad copy prompt for a product (refine asks for a better second variation)
+def build_ad_prompt(request: AdCopyRequest) -> str:
     if request.refine:
         prompt = f"""
         Previously, you generated an ad for this product. Now provide a second variation 
@@ -62,88 +146,311 @@ def generate_ad(request: AdCopyRequest):
         Key features: {request.description}
         Price: {request.price}
         """
-    max_retries = 3
-    attempt = 0
-    while attempt < max_retries:
-        try:
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a professional marketing copywriter."},
-                    {"role": "user", "content": prompt}
-                ],
-                timeout=60  # Increase timeout to 60 seconds
-            )
-            ad_text = response.choices[0].message.content
-            return {"ad_text": ad_text}
-        except Exception as e:
-            print(f"Error in generate_ad (attempt {attempt+1}): {e}")
-            attempt += 1
-            time.sleep(2)
-    return {"error": "Failed to generate ad text after several attempts."}
+    return prompt
+
+# Generate ad copy for a product. Retries, backoff and rate limiting
+# happen inside openai_client; failures propagate to the caller.
+async def write_ad_copy(request: AdCopyRequest) -> str:
+    prompt = build_ad_prompt(request)
+    # Refine requests exist to get a fresh variation, so they never read or fill the cache
+    key = cache_key(AD_COPY_MODEL, AD_COPY_SYSTEM_PROMPT, prompt)
+    if request.refine:
+        generation_cache.bypass()
+    else:
+        cached = await generation_cache.get(key)
+        if cached is not None:
+            return cached
+    response = await chat_completion(
+        AD_COPY_MODEL,
+        [
+            {"role": "system", "content": AD_COPY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        operation="gpt_ad_copy",
+        timeout=60  # Increase timeout to 60 seconds
+    )
+    ad_text = response.choices[0].message.content
+    if not request.refine:
+        await generation_cache.set(key, ad_text)
+    return ad_text
+
+@app.post("/generate_ad/")
+async def generate_ad(request: AdCopyRequest):
+    log_event("generate_ad", refine=request.refine, title_chars=len(request.title))
+    try:
+        ad_text = await write_ad_copy(request)
+    except Exception as e:
+        log_event("generate_ad_failed", level=logging.ERROR, error=str(e))
+        return {"error": "Failed to generate ad text after several attempts."}
+    return {"ad_text": ad_text}
+
+# How many times a stream that drops mid-way is resumed before giving up
+STREAM_MAX_RESUMES = 3
+
+# Format one Server-Sent Events message
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate_ad/stream")
+async def generate_ad_stream(request: AdCopyRequest):
+    # Stream ad copy tokens to the client as Server-Sent Events:
+    #   event: token  data: {"text": "..."}   (one per streamed delta)
+    #   event: done   data: {"ad_text": "..."} (full text, once)
+    #   event: error  data: {"error": "..."}
+    log_event("generate_ad_stream", refine=request.refine, title_chars=len(request.title))
+    prompt = build_ad_prompt(request)
+    key = cache_key(AD_COPY_MODEL, AD_COPY_SYSTEM_PROMPT, prompt)
+
+    async def generate():
+        if request.refine:
+            generation_cache.bypass()
+        else:
+            cached = await generation_cache.get(key)
+            if cached is not None:
+                yield sse_event("token", {"text": cached})
+                yield sse_event("done", {"ad_text": cached})
+                return
+
+        messages = [
+            {"role": "system", "content": AD_COPY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        # Everything already sent to the client. A retry after a partial stream
+        # asks the model to continue from here instead of starting over, so the
+        # client never receives the same tokens twice.
+        sent = []
+        started = time.perf_counter()
+        # Opening the stream is already retried by stream_chat_completion;
+        # this loop only resumes streams that drop after delivering chunks
+        resumes = 0
+        while True:
+            attempt_messages = messages
+            if sent:
+                attempt_messages = messages + [
+                    {"role": "assistant", "content": "".join(sent)},
+                    {"role": "user", "content": "Continue the ad exactly where you stopped. Do not repeat any text you already wrote."}
+                ]
+            try:
+                stream = await stream_chat_completion(
+                    AD_COPY_MODEL, attempt_messages, operation="gpt_ad_copy_stream_open", timeout=60
+                )
+            except Exception as e:
+                log_event("generate_ad_stream_failed", level=logging.ERROR, error=str(e))
+                if isinstance(e, openai_client.CircuitOpenError) or openai_client.is_retryable(e):
+                    break
+                # The 200 headers are already out, so report it in-band
+                yield sse_event("error", {"error": str(e)})
+                return
+            received = False
+            finish_reason = None
+            try:
+                # Closing the stream releases the connection even when the
+                # client disconnects or the stream fails part way
+                async with stream:
+                    async for chunk in stream:
+                        received = True
+                        # The final chunk has no choices, only token usage
+                        record_usage(AD_COPY_MODEL, chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        finish_reason = choice.finish_reason or finish_reason
+                        text = choice.delta.content
+                        if text:
+                            if not sent:
+                                observe_stage("gpt_ad_copy_first_token", time.perf_counter() - started)
+                            sent.append(text)
+                            yield sse_event("token", {"text": text})
+            except Exception as e:
+                if not openai_client.is_retryable(e):
+                    log_event("generate_ad_stream_failed", level=logging.ERROR, error=str(e))
+                    yield sse_event("error", {"error": str(e)})
+                    return
+                # The stream opened fine, so the breaker never saw this failure
+                openai_client.circuit.record_failure()
+                if not received or resumes >= STREAM_MAX_RESUMES:
+                    log_event("generate_ad_stream_failed", level=logging.ERROR, tokens_sent=len(sent), error=str(e))
+                    break
+                resumes += 1
+                log_event(
+                    "generate_ad_stream_retry",
+                    level=logging.WARNING,
+                    attempt=resumes,
+                    tokens_sent=len(sent),
+                    error=str(e)
+                )
+                await asyncio.sleep(backoff_delay(resumes, e))
+                continue
+            observe_stage("gpt_ad_copy_stream", time.perf_counter() - started)
+            ad_text = "".join(sent)
+            # Anything but "stop" (e.g. "length") means the text was cut short
+            if finish_reason != "stop":
+                log_event(
+                    "generate_ad_stream_incomplete",
+                    level=logging.WARNING,
+                    finish_reason=finish_reason,
+                    tokens_sent=len(sent)
+                )
+                yield sse_event("error", {"error": f"Ad text was cut short (finish_reason: {finish_reason})."})
+                return
+            if not request.refine:
+                await generation_cache.set(key, ad_text)
+            yield sse_event("done", {"ad_text": ad_text})
+            return
+        yield sse_event("error", {"error": "Failed to generate ad text after several attempts."})
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Ad Image Generation Endpoint with GPT Two-Step Approach
 class AdImageRequest(BaseModel):
     prompt: str  # The product description
     refine: bool = False  # If true, regenerate the image prompt
+    n: int = Field(1, ge=1, le=MAX_VARIATIONS)  # Number of image variations to generate
 
 @app.post("/generate_image/")
-def generate_image(request: AdImageRequest):
-    print(f"Received ad image request: {request}")
+async def generate_image(request: AdImageRequest, http_request: Request):
+    log_event("generate_image", refine=request.refine, n=request.n)
     try:
-        if request.refine:
-            gpt_prompt = f"""
-            Previously, you created a DALL·E prompt for this product.
-            Now produce a second variation in a simple, minimal pixel art style 
-            with bright, bold shapes. Keep the entire prompt under 500 characters.
-
-            Product details: {request.prompt}
-            """
-        else:
-            gpt_prompt = f"""
-            You are an AI prompt writer for DALL·E.
-            Please create a short (under 500 characters) pixel art style prompt 
-            that highlights the following product in a fun, cartoony environment.
-            Avoid large textual overlays in the image.
-
-            Product details: {request.prompt}
-            """
-        # Generate DALL·E prompt using GPT
-        gpt_response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a creative AI prompt writer for DALL·E."},
-                {"role": "user", "content": gpt_prompt}
-            ]
-        )
-        dall_e_prompt = gpt_response.choices[0].message.content.strip()
-        print("DALL·E prompt from GPT:", dall_e_prompt)
+        # Stage 1: GPT writes the DALL·E prompt (cached unless refining)
+        dall_e_prompt = await write_image_prompt(request.prompt, request.refine, generation_cache)
     except Exception as e:
-        print(f"Error generating DALL·E prompt via GPT: {e}")
+        log_event("image_prompt_failed", level=logging.ERROR, error=str(e))
         return {"error": str(e)}
     try:
-        url = "https://api.openai.com/v1/images/generations"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {openai.api_key}"
-        }
-        data = {
-            "prompt": dall_e_prompt,
-            "n": 1,
-            "size": "1024x1024"
-        }
-        response = requests.post(url, json=data, headers=headers)
-        print("RAW JSON response:", response.text)
-        image_response = response.json()
-        if "data" in image_response and len(image_response["data"]) > 0:
-            image_url = image_response["data"][0]["url"]
-            return {"image_url": image_url}
+        # Stage 2: DALL·E renders the variations, which are stored locally
+        digests = await render_images(dall_e_prompt, request.n)
+        if digests:
+            image_urls = [str(http_request.url_for("get_image", digest=digest)) for digest in digests]
+            return {"image_url": image_urls[0], "image_urls": image_urls}
         else:
-            return {"error": "No image data returned", "response": image_response}
+            return {"error": "No image data returned"}
     except Exception as e:
-        print(f"Error calling DALL·E endpoint: {e}")
+        log_event("image_generation_failed", level=logging.ERROR, error=str(e))
         return {"error": str(e)}
 
+# Serve generated images from the local content-addressed store.
+# The digest is the content hash, so the ETag never changes and the
+# response can be cached forever.
+@app.get("/images/{digest}.png", name="get_image")
+def get_image(digest: str, http_request: Request):
+    if not image_store.exists(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if digest in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image_store.path(digest), media_type="image/png", headers=headers)
+
+# Background "URL to ad bundle" jobs. The worker pool size bounds how many
+# bundles run at once; job state lives in SQLite (JOBS_DB) across restarts.
+JOBS_DB = os.environ.get("JOBS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "8"))
+
+# Scrape the product, then write copy and render the image in parallel
+async def build_ad_bundle(job_id: str, url: str, report) -> dict:
+    # Attribute this job's OpenAI usage to the product's store
+    try:
+        host = urlparse(url if "://" in url else f"https://{url}").hostname
+    except ValueError:
+        host = None
+    store_token = current_store.set(store_label(host))
+    try:
+        return await run_ad_bundle(url, report)
+    finally:
+        current_store.reset(store_token)
+
+async def run_ad_bundle(url: str, report) -> dict:
+    await report("scraping")
+    product = await scrape_shopify_product(url)
+    if product.title == "N/A":
+        raise RuntimeError(product.description)
+    result = {"product": product.model_dump()}
+    await report("generating", result)
+
+    copy_request = AdCopyRequest(
+        title=product.title,
+        description=product.description,
+        price=product.price or "N/A"
+    )
+
+    async def image_digests():
+        dall_e_prompt = await write_image_prompt(product.description, False, generation_cache)
+        return await render_images(dall_e_prompt)
+
+    ad_text, digests = await asyncio.gather(
+        write_ad_copy(copy_request), image_digests(), return_exceptions=True
+    )
+    errors = []
+    if isinstance(ad_text, Exception):
+        errors.append(f"ad text: {ad_text}")
+    else:
+        result["ad_text"] = ad_text
+    if isinstance(digests, Exception):
+        errors.append(f"ad image: {digests}")
+    else:
+        result["image_digests"] = digests
+    if errors:
+        await report("generating", result)
+        raise RuntimeError("; ".join(errors))
+    return result
+
+job_queue = JobQueue(JobStore(JOBS_DB), build_ad_bundle, workers=JOB_WORKERS)
+
+class JobRequest(BaseModel):
+    url: Optional[str] = None         # a single product URL
+    urls: Optional[List[str]] = Field(None, max_length=MAX_BATCH_URLS)  # or a whole catalog
+
+# Shape a stored job for clients, turning image digests into served URLs
+def job_response(job: dict, http_request: Request) -> dict:
+    result = job["result"]
+    if result and result.get("image_digests"):
+        result["image_urls"] = [
+            str(http_request.url_for("get_image", digest=digest)) for digest in result["image_digests"]
+        ]
+        result["image_url"] = result["image_urls"][0]
+    return job
+
+@app.post("/jobs", status_code=202)
+async def create_jobs(request: JobRequest):
+    urls = request.urls or ([request.url] if request.url else [])
+    if not urls:
+        raise HTTPException(status_code=422, detail="Provide a product url or a list of urls")
+    # One transaction for the whole batch
+    jobs = await job_queue.submit_many(urls)
+    if request.urls is None:
+        return {"job_id": jobs[0]["id"], "status": jobs[0]["status"]}
+    return {"job_ids": [job["id"] for job in jobs]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, http_request: Request):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job, http_request)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, http_request: Request):
+    # Server-Sent Events: one `status` event per state change, ending with the final state
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def generate():
+        async for job in job_queue.subscribe(job_id):
+            yield sse_event("status", job_response(job, http_request))
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Publish Ad Endpoint (Mock Integration)
 class PublishAdRequest(BaseModel):
     platform: str            # e.g., "facebook", "twitter", "google-ads"
@@ -156,7 +463,7 @@ class PublishAdRequest(BaseModel):
 
 @app.post("/publish_ad/")
 def publish_ad(request: PublishAdRequest):
-    print(f"Received publish ad request: {request}")
+    log_event("publish_ad", platform=request.platform)
     # Simulate a successful publish
     return {
         "message": "Ad published successfully!",
@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# In-process metrics published at /metrics in Prometheus text format,
+# plus a structured, sampled JSON logger that replaces ad-hoc prints.
+
+# Latency buckets (seconds) spanning cache hits to slow image generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Fraction of routine (non-error) log events that are actually written
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.1"))
+
+# Shopify store the current request is working for, used to attribute OpenAI usage
+current_store = ContextVar("current_store", default="unknown")
+
+# Store names come from clients, so only this many distinct stores get their
+# own label; anything past the cap, or not a valid hostname, counts as "other"
+MAX_STORE_LABELS = int(os.environ.get("METRICS_MAX_STORES", "200"))
+HOSTNAME = re.compile(r"^(?=.{1,253}$)[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?)*$")
+
+_store_labels = set()
+_store_labels_lock = threading.Lock()
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    le = format_labels(self.labelnames, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                inf = format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {series['sum']:g}")
+                lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled, by route and status.", ("method", "route", "status")
+))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency, by route.", ("method", "route")
+))
+stage_duration = registry.register(Histogram(
+    "stage_duration_seconds", "Time spent in each pipeline stage (fetch, parse, gpt_*, image_api, retry_wait, ...).", ("stage",)
+))
+openai_requests = registry.register(Counter(
+    "openai_requests_total", "OpenAI API calls, by operation and outcome.", ("operation", "outcome")
+))
+openai_retries = registry.register(Counter(
+    "openai_retries_total", "OpenAI call retries, by operation and error type.", ("operation", "reason")
+))
+openai_tokens = registry.register(Counter(
+    "openai_tokens_total", "OpenAI tokens reported in response.usage, by model, kind and store.", ("model", "kind", "store")
+))
+openai_images = registry.register(Counter(
+    "openai_images_total", "Images generated, by store.", ("store",)
+))
+
+
+# Time a block and record it under stage_duration_seconds{stage=...}
+@contextmanager
+def stage_timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=stage)
+
+
+def observe_stage(stage: str, seconds: float):
+    stage_duration.observe(seconds, stage=stage)
+
+
+# Bounded metrics label for a client-supplied store domain
+def store_label(domain: str) -> str:
+    host = (domain or "").strip().lower().rstrip(".")
+    if not HOSTNAME.match(host):
+        return "other"
+    with _store_labels_lock:
+        if host not in _store_labels:
+            if len(_store_labels) >= MAX_STORE_LABELS:
+                return "other"
+            _store_labels.add(host)
+    return host
+
+
+# Count the tokens from a completion's `usage` block against the current store
+def record_usage(model: str, usage):
+    if usage is None:
+        return
+    store = current_store.get()
+    openai_tokens.inc(usage.prompt_tokens or 0, model=model, kind="prompt", store=store)
+    openai_tokens.inc(usage.completion_tokens or 0, model=model, kind="completion", store=store)
+
+
+_logger = logging.getLogger("adgen")
+if not _logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+# Emit one JSON log line. Routine events are sampled at LOG_SAMPLE_RATE;
+# warnings and errors are always written.
+def log_event(event: str, level: int = logging.INFO, sample_rate: float = None, **fields):
+    if level < logging.WARNING:
+        rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        if rate < 1.0 and random.random() >= rate:
+            return
+    if not _logger.isEnabledFor(level):
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "level": logging.getLevelName(level).lower(), **fields}
+    _logger.log(level, json.dumps(record, default=str))
+
+
+# Route template (e.g. /jobs/{job_id}) so metrics don't get a label per id
+def route_label(request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# ASGI middleware body: time every request and attribute it to its route
+async def metrics_middleware(request, call_next):
+    start = time.perf_counter()
+    store = request.headers.get("x-shop-domain")
+    token = current_store.set(store_label(store)) if store else None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = route_label(request)
+        http_requests.inc(method=request.method, route=route, status=str(status))
+        http_duration.observe(elapsed, method=request.method, route=route)
+        log_event(
+            "http_request",
+            method=request.method,
+            route=route,
+            status=status,
+            duration_ms=round(elapsed * 1000, 2)
+        )
+        if token is not None:
+            current_store.reset(token)
@@ -7,3 +7,4 @@ class ProductDetails(BaseModel):
     description: str
     price: Optional[str] = None
     image_url: Optional[str] = None
+    url: Optional[str] = None
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import httpx
+import openai
+from metrics import log_event, observe_stage, openai_images, openai_requests, openai_retries, record_usage, current_store
+
+# All OpenAI traffic goes through this module: one shared AsyncOpenAI client,
+# a global RPM/TPM token-bucket limiter, a circuit breaker and retries with
+# exponential backoff + jitter that honour Retry-After.
+
+# Quotas (requests and tokens per minute) the limiter is sized to
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", "3500"))
+OPENAI_TPM = float(os.environ.get("OPENAI_TPM", "90000"))
+OPENAI_IMAGES_PER_MINUTE = float(os.environ.get("OPENAI_IMAGES_PER_MINUTE", "50"))
+MAX_IN_FLIGHT = int(os.environ.get("OPENAI_MAX_IN_FLIGHT", "64"))
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 20.0
+DEFAULT_TIMEOUT = 60
+
+# Tokens we reserve for a completion when the caller doesn't set max_tokens
+COMPLETION_TOKEN_ALLOWANCE = 512
+
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+# Status codes worth retrying; anything else is the caller's fault
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+# Raised without calling upstream while the circuit breaker is open
+class CircuitOpenError(Exception):
+    pass
+
+
+# Token bucket that refills continuously at `rate_per_minute`.
+# Waiters are served strictly in arrival order (asyncio.Lock is FIFO),
+# so a burst queues fairly instead of stampeding when tokens free up.
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        # Never ask for more than the bucket can ever hold
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+# Trips after consecutive upstream failures and fails fast until the reset
+# timeout passes; then lets a single trial request through (half-open)
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    # Returns True when this call took the half-open trial slot; the caller
+    # must then release it with release_trial() however the call ends
+    def before_call(self) -> bool:
+        state = self.state
+        if state == "open" or (state == "half-open" and self.trial_in_flight):
+            raise CircuitOpenError("OpenAI circuit breaker is open; upstream is degraded")
+        if state == "half-open":
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+_client = None
+request_bucket = TokenBucket(OPENAI_RPM)
+token_bucket = TokenBucket(OPENAI_TPM)
+image_bucket = TokenBucket(OPENAI_IMAGES_PER_MINUTE)
+circuit = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+_in_flight = None
+
+
+def get_client() -> openai.AsyncOpenAI:
+    global _client
+    if _client is None:
+        # Retries are handled here, not by the SDK
+        _client = openai.AsyncOpenAI(
+            api_key=openai.api_key or os.environ.get("OPENAI_API_KEY"),
+            max_retries=0,
+            timeout=DEFAULT_TIMEOUT
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def in_flight_limit() -> asyncio.Semaphore:
+    global _in_flight
+    if _in_flight is None:
+        _in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+    return _in_flight
+
+
+# Rough token estimate for TPM budgeting (~4 characters per token)
+def estimate_tokens(messages: list, max_tokens: int = None) -> int:
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + (max_tokens or COMPLETION_TOKEN_ALLOWANCE)
+
+
+# Connection drops while reading a stream surface as raw httpx transport errors
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+# Seconds the server asked us to wait, from retry-after-ms or Retry-After
+def retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+# Full-jitter exponential backoff, overridden by the server's Retry-After
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    hinted = retry_after(error) if error is not None else None
+    if hinted is not None:
+        return min(max(hinted, 0.0), BACKOFF_CAP)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+# Run one OpenAI call through the breaker, limiters and retry loop.
+# `bucket` / `cost` select which quota the call draws from; `operation`
+# names the call in metrics (each attempt is timed as that stage).
+async def call_with_retries(make_call, bucket: TokenBucket, cost: float, operation: str,
+                            max_retries: int = MAX_RETRIES):
+    attempt = 0
+    while True:
+        try:
+            holds_trial = circuit.before_call()
+        except CircuitOpenError:
+            openai_requests.inc(operation=operation, outcome="circuit_open")
+            raise
+        # Always give the trial slot back, including when the call is
+        # cancelled (client disconnect, shutdown), or the breaker would
+        # stay half-open with a trial "in flight" forever
+        try:
+            wait_start = time.perf_counter()
+            await request_bucket.acquire()
+            await bucket.acquire(cost)
+            async with in_flight_limit():
+                observe_stage("openai_queue", time.perf_counter() - wait_start)
+                call_start = time.perf_counter()
+                try:
+                    result = await make_call()
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                observe_stage(operation, time.perf_counter() - call_start)
+            if error is None:
+                circuit.record_success()
+                openai_requests.inc(operation=operation, outcome="success")
+                return result
+            if not is_retryable(error):
+                # A bad request says nothing about upstream health
+                openai_requests.inc(operation=operation, outcome="error")
+                raise error
+            circuit.record_failure()
+            if attempt >= max_retries:
+                openai_requests.inc(operation=operation, outcome="error")
+                raise error
+        finally:
+            if holds_trial:
+                circuit.release_trial()
+        delay = backoff_delay(attempt, error)
+        openai_retries.inc(operation=operation, reason=type(error).__name__)
+        log_event(
+            "openai_retry",
+            level=logging.WARNING,
+            operation=operation,
+            attempt=attempt + 1,
+            delay_s=round(delay, 2),
+            error=str(error)
+        )
+        attempt += 1
+        observe_stage("retry_wait", delay)
+        await asyncio.sleep(delay)
+
+
+async def chat_completion(model: str, messages: list, operation: str = "gpt", **kwargs):
+    response = await call_with_retries(
+        lambda: get_client().chat.completions.create(model=model, messages=messages, **kwargs),
+        token_bucket,
+        estimate_tokens(messages, kwargs.get("max_tokens")),
+        operation
+    )
+    record_usage(model, response.usage)
+    return response
+
+
+# Open a streaming completion. Only opening the stream is retried here;
+# callers handle drops mid-stream since they know what was already delivered.
+# The final chunk carries `usage`; pass it to metrics.record_usage.
+async def stream_chat_completion(model: str, messages: list, operation: str = "gpt_stream", **kwargs):
+    return await call_with_retries(
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        ),
+        token_bucket,
+        estimate_tokens(messages, kwargs.get("max_tokens")),
+        operation
+    )
+
+
+async def generate_images(prompt: str, n: int = 1, size: str = "1024x1024", **kwargs):
+    response = await call_with_retries(
+        lambda: get_client().images.generate(prompt=prompt, n=n, size=size, **kwargs),
+        image_bucket,
+        n,
+        "image_api"
+    )
+    openai_images.inc(len(response.data or []), store=current_store.get())
+    return response
+
+
+def snapshot() -> dict:
+    return {
+        "circuit_state": circuit.state,
+        "consecutive_failures": circuit.failures,
+        "request_tokens_available": round(request_bucket.tokens, 2),
+        "tpm_tokens_available": round(token_bucket.tokens, 2),
+        "image_tokens_available": round(image_bucket.tokens, 2)
+    }
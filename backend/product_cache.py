@@ -0,0 +1,109 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+from models import ProductDetails
+
+PRODUCT_CACHE_TTL = float(os.environ.get("PRODUCT_CACHE_TTL", "300"))
+PRODUCT_CACHE_SIZE = int(os.environ.get("PRODUCT_CACHE_SIZE", "1000"))
+
+# Matches the product handle in /products/<handle>, /collections/<c>/products/<handle>,
+# locale-prefixed paths and so on
+PRODUCT_PATH = re.compile(r"/products/([^/?#]+)")
+COLLECTION_SUFFIX = re.compile(r"/collections/[^/]+$")
+
+# Query parameters that only track the visit (or pick a variant of the same
+# product page) and never change the scraped product details
+TRACKING_PARAMS = {
+    "variant", "fbclid", "gclid", "dclid", "msclkid", "ttclid", "yclid", "srsltid",
+    "mc_cid", "mc_eid", "ref", "ref_", "_pos", "_psq", "_ss", "_sid", "_fid", "_v"
+}
+
+
+def is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMS
+
+
+# Canonical cache key for a product URL: lower-cased host, no fragment,
+# tracking parameters (UTM tags, ?variant=..., click ids) dropped and the rest
+# sorted, and collection paths collapsed onto /products/<handle> while keeping
+# any locale prefix (/fr/products/<handle> stays distinct). Raises ValueError
+# for URLs that cannot be parsed.
+def normalize_product_url(url: str) -> str:
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    scheme = parsed.scheme.lower() or "https"
+    host = parsed.netloc.lower()
+    match = PRODUCT_PATH.search(parsed.path)
+    if match:
+        prefix = COLLECTION_SUFFIX.sub("", parsed.path[:match.start()])
+        path = f"{prefix}/products/{match.group(1)}"
+    else:
+        path = parsed.path.rstrip("/") or "/"
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not is_tracking_param(name)
+    )
+    query = f"?{urlencode(params)}" if params else ""
+    return f"{scheme}://{host}{path}{query}"
+
+
+class CacheEntry:
+    def __init__(self, product: ProductDetails, etag: Optional[str], last_modified: Optional[str]):
+        self.product = product
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    # Headers for a conditional GET, or {} if the origin gave us no validators
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+# LRU cache of scraped products. Entries older than `ttl` are kept (until
+# evicted) so they can be revalidated with a conditional GET instead of refetched.
+class ProductCache:
+    def __init__(self, ttl: float = PRODUCT_CACHE_TTL, max_entries: int = PRODUCT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.age < self.ttl
+
+    def put(self, key: str, product: ProductDetails, etag: Optional[str], last_modified: Optional[str]):
+        self._entries[key] = CacheEntry(product, etag, last_modified)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # Mark a stale entry fresh again after a 304, picking up any new validators
+    def refresh(self, entry: CacheEntry, etag: Optional[str], last_modified: Optional[str]):
+        entry.fetched_at = time.time()
+        entry.etag = etag or entry.etag
+        entry.last_modified = last_modified or entry.last_modified
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
+
+
+product_cache = ProductCache()
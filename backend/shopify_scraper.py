@@ -1,98 +1,238 @@
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 from models import ProductDetails
-import json
+from html_extractor import ProductPageParser
+from http_client import fetch, fetch_stream
+from product_cache import PRODUCT_PATH, normalize_product_url, product_cache
+from metrics import observe_stage
+import time
+from urllib.parse import urlparse
 
-# Extract product details from a Shopify product page 
-def scrape_shopify_product(url: str) -> ProductDetails:
-    
-    headers = {"User-Agent": "Mozilla/5.0"}
-    
+# Shopify caps products.json pages at 250 items
+STORE_PAGE_LIMIT = 250
+# Hard stop for feeds that never run out of pages (100,000 products)
+STORE_MAX_PAGES = 400
+
+# Extract product details from a Shopify product page, reporting how the
+# product cache was used: "HIT" (fresh entry), "REVALIDATED" (stale entry
+# confirmed by a 304) or "MISS" (page fetched and parsed).
+async def scrape_product_with_status(url: str):
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
+        key = normalize_product_url(url)
+    except ValueError as e:
+        return ProductDetails(
+            title="N/A",
+            description=f"Invalid product URL: {str(e)}",
+            price=None,
+            image_url=None
+        ), "MISS"
+    entry = product_cache.get(key)
+    if entry is not None and product_cache.is_fresh(entry):
+        product_cache.stats["hits"] += 1
+        return entry.product.model_copy(), "HIT"
+
+    # The body is parsed as it streams in and the download stops as soon as
+    # the head and the price-bearing script blocks have been seen
+    parser = ProductPageParser()
+    headers = entry.validators() if entry is not None else {}
+    # Fetch the URL as given (query string included); only the cache key is normalized
+    target = url if "://" in url else f"https://{url}"
+    # Fetch and parse interleave while streaming, so time spent inside the
+    # parser is tracked separately and subtracted from the fetch time
+    started = time.perf_counter()
+    parse_time = 0.0
+    try:
+        async with fetch_stream(target, headers=headers) as response:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if response.status_code == 304 and entry is not None:
+                observe_stage("fetch", time.perf_counter() - started)
+                product_cache.refresh(entry, etag, last_modified)
+                product_cache.stats["revalidated"] += 1
+                return entry.product.model_copy(), "REVALIDATED"
+            response.raise_for_status()
+            async for chunk in response.aiter_text():
+                parse_start = time.perf_counter()
+                parser.feed(chunk)
+                parse_time += time.perf_counter() - parse_start
+                if parser.done:
+                    break
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        observe_stage("fetch", time.perf_counter() - started)
         return ProductDetails(
             title="N/A",
             description=f"Error fetching page: {str(e)}",
             price=None,
             image_url=None
-        )
-    
-    soup = BeautifulSoup(response.text, "html.parser")
+        ), "MISS"
 
-    # Extract title from og:title or fallback to <title>
-    title_tag = soup.find("meta", {"property": "og:title"})
-    title = title_tag["content"].strip() if title_tag and title_tag.get("content") else (soup.find("title").text.strip() if soup.find("title") else "N/A")
+    parse_start = time.perf_counter()
+    if not parser.done:
+        parser.close()
+    product = product_from_parser(parser)
+    parse_time += time.perf_counter() - parse_start
+    observe_stage("parse", parse_time)
+    observe_stage("fetch", time.perf_counter() - started - parse_time)
+    product_cache.stats["misses"] += 1
+    product_cache.put(key, product, etag, last_modified)
+    return product.model_copy(), "MISS"
 
-    # Extract description from og:description
-    desc_tag = soup.find("meta", {"property": "og:description"})
-    description = desc_tag["content"].strip() if desc_tag and desc_tag.get("content") else "N/A"
+# Extract product details from a Shopify product page
+async def scrape_shopify_product(url: str) -> ProductDetails:
+    product, _ = await scrape_product_with_status(url)
+    return product
 
-    # Extract image URL from og:image
-    image_tag = soup.find("meta", {"property": "og:image"})
-    image_url = image_tag["content"].strip() if image_tag and image_tag.get("content") else None
+# Scrape several product pages concurrently, preserving input order
+async def scrape_shopify_products(urls: list) -> list:
+    return await asyncio.gather(*(scrape_shopify_product(url) for url in urls))
+
+def product_from_parser(parser: ProductPageParser) -> ProductDetails:
+    return ProductDetails(
+        title=parser.title,
+        description=parser.description,
+        price=parser.price,
+        image_url=parser.image_url
+    )
+
+# Reduce a product or collection URL to the storefront root (scheme + host)
+def store_root(url: str) -> str:
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+# Turn a product's body_html into the plain text we store as the description
+def html_to_text(body_html: str) -> str:
+    if not body_html:
+        return ""
+    return BeautifulSoup(body_html, "html.parser").get_text(" ", strip=True)
+
+# Build ProductDetails from a products.json / <handle>.js record, or return
+# None if the entry has no title or handle. An empty description is kept:
+# the HTML page wouldn't have a better one.
+def product_from_json(product: dict, root: str):
+    title = (product.get("title") or "").strip()
+    description = html_to_text(product.get("body_html") or product.get("description") or "")
+    handle = product.get("handle")
+    if not title or not handle:
+        return None
 
-    # Initialize price
     price = None
+    variants = product.get("variants") or []
+    if variants and isinstance(variants[0], dict) and variants[0].get("price") is not None:
+        price = variants[0]["price"]
+        # <handle>.js reports prices in cents as integers
+        if isinstance(price, int):
+            price = f"{price / 100:.2f}"
+        price = str(price).strip()
 
-    # Try meta tag for price
-    meta_price = soup.find("meta", {"property": "product:price:amount"})
-    if meta_price and meta_price.get("content"):
-        price = meta_price["content"].strip()
-
-    # Fallback: Try JSON-LD script blocks
-    if not price:
-        ld_json_tags = soup.find_all("script", {"type": "application/ld+json"})
-        for tag in ld_json_tags:
-            if not tag.string:
-                continue
-            try:
-                data = json.loads(tag.string)
-                if isinstance(data, dict) and data.get("@type") == "Product":
-                    offers = data.get("offers")
-                    if offers and isinstance(offers, dict) and "price" in offers:
-                        price = offers["price"]
-                        break
-                elif isinstance(data, list):
-                    for item in data:
-                        if isinstance(item, dict) and item.get("@type") == "Product":
-                            offers = item.get("offers")
-                            if offers and isinstance(offers, dict) and "price" in offers:
-                                price = offers["price"]
-                                break
-                    if price:
-                        break
-            except (json.JSONDecodeError, TypeError):
-                pass
-
-    # Fallback: Check application/json script blocks for variants
-    if not price:
-        json_scripts = soup.find_all("script", {"type": "application/json"})
-        for script_tag in json_scripts:
-            if not script_tag.string:
-                continue
-            try:
-                data = json.loads(script_tag.string)
-                if isinstance(data, dict):
-                    variants = data.get("variants")
-                    if variants and isinstance(variants, list) and len(variants) > 0:
-                        possible_price = variants[0].get("price")
-                        if possible_price:
-                            price = possible_price.strip()
-                            break
-            except (json.JSONDecodeError, TypeError):
-                pass
-            if price:
-                break
-
-    # Final fallback if price is still not found
-    if not price:
-        price = None
+    image_url = None
+    images = product.get("images") or []
+    if images:
+        first = images[0]
+        image_url = first.get("src") if isinstance(first, dict) else first
+    image_url = image_url or product.get("featured_image")
+    if image_url and image_url.startswith("//"):
+        image_url = f"https:{image_url}"
 
     return ProductDetails(
         title=title,
         description=description,
         price=price,
-        image_url=image_url
+        image_url=image_url,
+        url=f"{root}/products/{handle}"
     )
+
+# Walk the paginated /products.json feed, yielding one page of raw product dicts
+# at a time. Products already seen on an earlier page are dropped, and the walk
+# stops at a page with nothing new (hosts that ignore `page` repeat the first one)
+# or after STORE_MAX_PAGES pages.
+async def iter_store_feed(root: str):
+    seen = set()
+    for page in range(1, STORE_MAX_PAGES + 1):
+        response = await fetch(
+            f"{root}/products.json",
+            params={"limit": STORE_PAGE_LIMIT, "page": page}
+        )
+        response.raise_for_status()
+        products = response.json().get("products") or []
+        new = []
+        for product in products:
+            key = product.get("id") or product.get("handle")
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            new.append(product)
+        if not new:
+            return
+        yield new
+        if len(products) < STORE_PAGE_LIMIT:
+            return
+
+# Fetch a single product from the lighter <handle>.js endpoint
+async def fetch_product_js(root: str, handle: str):
+    try:
+        response = await fetch(f"{root}/products/{handle}.js")
+        response.raise_for_status()
+        return product_from_json(response.json(), root)
+    except (httpx.HTTPError, ValueError):
+        return None
+
+# Resolve a feed entry too incomplete to use (no title) from <handle>.js
+async def resolve_feed_gap(root: str, handle: str) -> ProductDetails:
+    product = await fetch_product_js(root, handle)
+    if product is None:
+        product = ProductDetails(
+            title="N/A",
+            description="Product feed entry is incomplete and <handle>.js is unavailable",
+            price=None,
+            image_url=None,
+            url=f"{root}/products/{handle}"
+        )
+    return product
+
+# Resolve a product the feed doesn't list (or a store whose feed is
+# unavailable): try <handle>.js first, then the HTML product page
+async def resolve_missing_product(root: str, handle: str) -> ProductDetails:
+    product = await fetch_product_js(root, handle)
+    if product is None:
+        product = await scrape_shopify_product(f"{root}/products/{handle}")
+        product.url = f"{root}/products/{handle}"
+    return product
+
+# Yield ProductDetails for every product in a Shopify store.
+# Uses the bulk JSON feed; incomplete entries are resolved from <handle>.js
+# (concurrently, page by page). If `url` names a product that the feed doesn't
+# list, or the feed is unavailable, that product is scraped directly instead
+# (after the error record that reports the failed feed).
+async def scrape_shopify_store(url: str):
+    root = store_root(url)
+    match = PRODUCT_PATH.search(urlparse(url if "://" in url else f"https://{url}").path)
+    requested = match.group(1) if match else None
+    seen = set()
+
+    try:
+        async for page in iter_store_feed(root):
+            gaps = []
+            for raw in page:
+                handle = raw.get("handle")
+                if handle:
+                    seen.add(handle)
+                product = product_from_json(raw, root)
+                if product is not None:
+                    yield product
+                elif handle:
+                    gaps.append(handle)
+            for product in await asyncio.gather(*(resolve_feed_gap(root, handle) for handle in gaps)):
+                yield product
+    except (httpx.HTTPError, ValueError) as e:
+        yield ProductDetails(
+            title="N/A",
+            description=f"Error fetching store feed: {str(e)}",
+            price=None,
+            image_url=None,
+            url=root
+        )
+
+    if requested is not None and requested not in seen:
+        yield await resolve_missing_product(root, requested)
@@ -43,6 +43,15 @@ function App() {
 
   const toast = useToast();
 
+  // Store host sent with generation requests so the backend can attribute API usage per store
+  const shopHeaders = () => {
+    try {
+      return { "X-Shop-Domain": new URL(url).host };
+    } catch {
+      return {};
+    }
+  };
+
   // Fetch Shopify product details
   const fetchProduct = async () => {
     setLoading(true);
@@ -83,23 +92,65 @@ function App() {
       return;
     }
     setLoading(true);
+    const refining = adText ? true : false;
+    // Shown again if the new text fails or is cut short
+    const previousText = adText;
     try {
-      const response = await axios.post("http://127.0.0.1:8000/generate_ad/", {
-        title: product.title || "Unknown Product",
-        description: product.description || "No description available.",
-        price: product.price || "N/A",
-        refine: adText ? true : false,
+      // Stream tokens over SSE so the text appears as it is generated
+      const response = await fetch("http://127.0.0.1:8000/generate_ad/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json", ...shopHeaders() },
+        body: JSON.stringify({
+          title: product.title || "Unknown Product",
+          description: product.description || "No description available.",
+          price: product.price || "N/A",
+          refine: refining,
+        }),
       });
-      console.log("Ad Text Response:", response.data);
-      if (response.data.ad_text) {
-        setAdText(response.data.ad_text);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let streamed = "";
+      let finalText = "";
+      let streamError = null;
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const eventLine = raw.split("\n").find((line) => line.startsWith("event: "));
+          const dataLine = raw.split("\n").find((line) => line.startsWith("data: "));
+          if (!eventLine || !dataLine) continue;
+          const event = eventLine.slice(7);
+          const data = JSON.parse(dataLine.slice(6));
+          if (event === "token") {
+            streamed += data.text;
+            setAdText(streamed);
+          } else if (event === "done") {
+            finalText = data.ad_text;
+          } else if (event === "error") {
+            streamError = data.error;
+          }
+        }
+      }
+      if (streamError) {
+        throw new Error(streamError);
+      }
+      if (finalText) {
+        setAdText(finalText);
         toast({
-          title: adText ? "Ad Text Regenerated!" : "Ad Text Generated!",
+          title: refining ? "Ad Text Regenerated!" : "Ad Text Generated!",
           status: "success",
           duration: 3000,
           isClosable: true,
         });
       } else {
+        setAdText(previousText);
         toast({
           title: "No ad text returned.",
           status: "warning",
@@ -108,7 +159,8 @@ function App() {
         });
       }
     } catch (err) {
-      console.error("Generate Ad Text Error:", err.response?.data || err);
+      console.error("Generate Ad Text Error:", err);
+      setAdText(previousText);
       toast({
         title: "Failed to generate ad text.",
         status: "error",
@@ -136,7 +188,7 @@ function App() {
       const response = await axios.post("http://127.0.0.1:8000/generate_image/", {
         prompt: product.description || "An exciting product",
         refine: adImage ? true : false,
-      });
+      }, { headers: shopHeaders() });
       console.log("Ad Image Response:", response.data);
       if (response.data.image_url) {
         setAdImage(response.data.image_url);